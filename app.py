@@ -1,9 +1,20 @@
 import streamlit as st
 import yfinance as yf
 import pandas as pd
+import numpy as np
+from numba import njit
 import time
+import os
+import hashlib
+import tempfile
+import threading
 import smtplib
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FetchTimeout
 from email.message import EmailMessage
+from email.policy import default as email_policy
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 # =========================
 # Page config
@@ -115,10 +126,15 @@ watchlist = [s.strip().upper() for s in watchlist_input.split(",") if s.strip()]
 # =========================
 st.sidebar.markdown("### 🗓️ Expiration Selection")
 
+# Shared (unpickled) Ticker per symbol; the ttl also refreshes its memoized expirations
+@st.cache_resource(ttl=3600, max_entries=256, show_spinner=False)
+def get_ticker(ticker):
+    return yf.Ticker(ticker)
+
 @st.cache_data(ttl=300)
 def safe_get_expirations(ticker):
     try:
-        exps = yf.Ticker(ticker).options
+        exps = get_ticker(ticker).options
         return list(exps) if exps else []
     except Exception:
         return []
@@ -146,218 +162,571 @@ UNUSUAL_MIN = st.sidebar.number_input("Unusual (Vol / OI ≥)", 0.1, value=1.0,
 HIGH_MIN = st.sidebar.number_input("High activity ≥", UNUSUAL_MIN, value=1.5, step=0.1)
 EXTREME_MIN = st.sidebar.number_input("Extreme activity ≥", HIGH_MIN, value=3.0, step=0.5)
 MIN_VOLUME = st.sidebar.number_input("Minimum contract volume", 1, value=100, step=10)
+TOP_N = st.sidebar.number_input("Max contracts shown", 50, value=500, step=50)
+
+thresholds = (UNUSUAL_MIN, HIGH_MIN, EXTREME_MIN, MIN_VOLUME)
 
-AUTO_REFRESH = st.sidebar.checkbox("Auto-refresh every 60s", value=False)
+AUTO_REFRESH = st.sidebar.checkbox(
+    "Auto-refresh",
+    value=False,
+    help="Every 15s near the open/close, 60s mid-session, 5 min outside market hours"
+)
 
 # =========================
 # Data helpers
 # =========================
-@st.cache_data(ttl=60)
+# Expirations only change daily; chains and spot go stale quickly
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
 def get_expirations(ticker):
-    return yf.Ticker(ticker).options
+    return get_ticker(ticker).options
 
-@st.cache_data(ttl=60)
-def load_chain(ticker, expiration):
-    chain = yf.Ticker(ticker).option_chain(expiration)
-    return chain.calls, chain.puts
-
-@st.cache_data(ttl=60)
-def get_spot_price(ticker):
-    hist = yf.Ticker(ticker).history(period="1d")
-    return hist["Close"].iloc[-1] if not hist.empty else None
-
-def classify_activity(ratio):
-    if pd.isna(ratio):
-        return "Unknown"
-    if ratio >= EXTREME_MIN:
-        return "Extreme"
-    if ratio >= HIGH_MIN:
-        return "High"
-    if ratio >= UNUSUAL_MIN:
-        return "Unusual"
-    return "Normal"
-
-def add_relative_volume(df):
-    median_vol = df["volume"].median()
-    df["relative_volume"] = (
-        df["volume"] / median_vol if median_vol and median_vol > 0 else pd.NA
-    )
+def _narrow_chain(df):
+    # Counts fit in 32 bits or less; prices stay float64 so strike-vs-spot compares exactly
+    df = df.convert_dtypes(dtype_backend="pyarrow")
+    for col in ("volume", "openInterest"):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], downcast="integer")
     return df
 
-def style_activity(col):
-    styles = {
-        "Extreme": "background-color:#00ffff; color:black; font-weight:600",
-        "High": "background-color:#8a2be2; color:white; font-weight:600",
-        "Unusual": "background-color:#ffd700; color:black; font-weight:600",
-    }
-    return [styles.get(v, "") for v in col]
-
-def find_unusual(df, option_type, symbol, expiration, spot):
-    df = df.copy()
+# Chain and spot TTLs match the fastest auto-refresh tier so a 15s poll sees new quotes
+@st.cache_data(ttl=15, max_entries=512, show_spinner=False)
+def load_chain(ticker, expiration):
+    chain = get_ticker(ticker).option_chain(expiration)
+    return _narrow_chain(chain.calls), _narrow_chain(chain.puts)
+
+@st.cache_data(ttl=15, max_entries=256, show_spinner=False)
+def get_spot_prices(tickers):
+    # One batched history request for the whole watchlist (tickers is a tuple so it hashes)
+    data = yf.download(
+        list(tickers), period="1d", progress=False, threads=True, group_by="ticker"
+    )
+    if not isinstance(data.columns, pd.MultiIndex):
+        data = pd.concat({tickers[0]: data}, axis=1)
 
-    df["volume"] = df["volume"].fillna(0).astype(int)
-    df["openInterest"] = df["openInterest"].replace(0, pd.NA)
+    spots = {}
+    for ticker in tickers:
+        if ticker not in data.columns.get_level_values(0):
+            continue
+        close = data[ticker]["Close"].dropna()
+        if not close.empty:
+            spots[ticker] = float(close.iloc[-1])
+    return spots
 
-    df["Vol / OI"] = df["volume"] / df["openInterest"]
-    df["Activity"] = df["Vol / OI"].apply(classify_activity)
+# =========================
+# Results snapshots (shared across sessions / processes)
+# =========================
+SNAPSHOT_TTL = 60  # seconds a snapshot is served instead of refetching
+SNAPSHOT_KEEP = 3600  # seconds before an old snapshot (or orphaned temp file) is deleted
+SNAPSHOT_DIR = Path(tempfile.gettempdir())
+DICTIONARY_COLS = ["Ticker", "Type", "Activity", "Moneyness"]
 
-    df = add_relative_volume(df)
+def snapshot_path(kind, key):
+    return SNAPSHOT_DIR / f"options_dashboard_{kind}_{key}.parquet"
 
-    df["Spot"] = spot
-    df["% From Spot"] = ((df["strike"] - spot) / spot).abs() * 100
+def load_snapshot(path, max_age=SNAPSHOT_TTL):
+    try:
+        if time.time() - path.stat().st_mtime < max_age:
+            return pd.read_parquet(path)
+    except Exception:
+        pass
+    return None
+
+def prune_snapshots(max_age=SNAPSHOT_KEEP):
+    cutoff = time.time() - max_age
+    for stale in SNAPSHOT_DIR.glob("options_dashboard_*"):
+        try:
+            if stale.stat().st_mtime < cutoff:
+                stale.unlink()
+        except OSError:
+            pass
+
+def save_snapshot(df, path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Sessions are threads of one process, so every write needs its own temp file
+    try:
+        fd, tmp = tempfile.mkstemp(dir=SNAPSHOT_DIR, prefix="options_dashboard_", suffix=".tmp")
+    except OSError:
+        return
+    os.close(fd)
+    try:
+        pq.write_table(
+            table,
+            tmp,
+            compression="zstd",
+            use_dictionary=[c for c in DICTIONARY_COLS if c in df.columns],
+        )
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+    prune_snapshots()
+
+# Kernel codes index straight into these label arrays
+ACTIVITY_LABELS = np.array(["Normal", "Unusual", "High", "Extreme", "Unknown"])
+MONEYNESS_LABELS = np.array(["ITM", "ATM", "OTM"])
+
+# Table label per activity code; Unknown (and anything unrecognised) shows as Normal
+ACTIVITY_DISPLAY = np.array(["Normal", "🟦 Unusual", "🟪 High", "🟨 Extreme", "Normal"])
+
+@njit(cache=True)
+def classify_chain(vol, oi, strike, spot, median_vol, unusual_min, high_min, extreme_min, min_volume, is_call):
+    # One pass per chain: every derived metric, both bucket codes and the keep mask
+    n = vol.shape[0]
+    vol_oi = np.empty(n)
+    pct_from_spot = np.empty(n)
+    rel_vol = np.empty(n)
+    activity = np.empty(n, np.int8)
+    moneyness = np.empty(n, np.int8)
+    keep = np.empty(n, np.bool_)
+
+    for i in range(n):
+        r = vol[i] / oi[i] if oi[i] > 0 else np.nan
+        vol_oi[i] = r
+
+        # ratio == threshold lands in the higher bucket
+        if np.isnan(r):
+            a = 4
+        elif r >= extreme_min:
+            a = 3
+        elif r >= high_min:
+            a = 2
+        elif r >= unusual_min:
+            a = 1
+        else:
+            a = 0
+        activity[i] = a
+
+        rel_vol[i] = vol[i] / median_vol if median_vol > 0 else np.nan
+
+        # Calls are OTM above spot, puts below; exactly at spot is ATM
+        d = strike[i] - spot
+        pct_from_spot[i] = abs(d) / spot * 100
+        if d > 0:
+            moneyness[i] = 2 if is_call else 0
+        elif d < 0:
+            moneyness[i] = 0 if is_call else 2
+        else:
+            moneyness[i] = 1
 
-    df["Moneyness"] = "ATM"
-    if option_type == "CALL":
-        df.loc[df["strike"] > spot, "Moneyness"] = "OTM"
-        df.loc[df["strike"] < spot, "Moneyness"] = "ITM"
-    else:
-        df.loc[df["strike"] < spot, "Moneyness"] = "OTM"
-        df.loc[df["strike"] > spot, "Moneyness"] = "ITM"
+        keep[i] = vol[i] >= min_volume and a != 0
 
-    filtered = df[
-        (df["volume"] >= MIN_VOLUME) &
-        (df["Activity"] != "Normal")
-    ]
+    return vol_oi, pct_from_spot, rel_vol, activity, moneyness, keep
 
-    if filtered.empty:
-        return filtered
-
-    filtered["Ticker"] = symbol
-    filtered["Expiration"] = expiration
-    filtered["Type"] = option_type
-    filtered["Strike"] = filtered["strike"].map(lambda x: f"${x:,.2f}")
-
-    return filtered[
-        [
-            "Ticker",
-            "Type",
-            "Expiration",
-            "Strike",
-            "Spot",
-            "% From Spot",
-            "Moneyness",
-            "volume",
-            "relative_volume",
-            "openInterest",
-            "Vol / OI",
-            "Activity",
-            "impliedVolatility",
-        ]
-    ].rename(columns={
-        "volume": "Volume",
-        "relative_volume": "Relative Volume",
-        "openInterest": "Open Interest",
-        "impliedVolatility": "Implied Volatility",
-    })
+ACTIVITY_STYLES = {
+    "Extreme": "background-color:#00ffff; color:black; font-weight:600",
+    "High": "background-color:#8a2be2; color:white; font-weight:600",
+    "Unusual": "background-color:#ffd700; color:black; font-weight:600",
+}
 
-# =========================
-# Main processing
-# =========================
-contract_results = []
-imbalance_rows = []
+def style_activity(col):
+    # One vectorized comparison per styled label instead of a dict lookup per row
+    arr = col.to_numpy()
+    out = np.full(arr.shape, "", dtype=object)
+    for label, style in ACTIVITY_STYLES.items():
+        out[arr == label] = style
+    return out.tolist()
+
+# Columns the contract table renders, in order; anything else is never gathered
+DISPLAY_COLS = [
+    "Ticker",
+    "Type",
+    "Expiration",
+    "Strike",
+    "Spot",
+    "% From Spot",
+    "Moneyness",
+    "Volume",
+    "Relative Volume",
+    "Open Interest",
+    "Vol / OI",
+    "Activity",
+    "Implied Volatility",
+]
+
+# (column, printf format, scale, thousands separators) for server-side display text
+DISPLAY_FORMATS = [
+    ("Implied Volatility", "%.2f%%", 100, False),
+    ("Strike", "$%.2f", 1, True),
+    ("Spot", "$%.2f", 1, True),
+]
+
+def format_column(s, fmt, scale=1, thousands=False):
+    # Format all present values in one np.char.mod pass; missing values render as "—"
+    vals = s.to_numpy(dtype=float, na_value=np.nan) * scale
+    present = ~np.isnan(vals)
+    text = np.char.mod(fmt, vals[present])
+    if thousands:
+        text = pd.Series(text).str.replace(r"\B(?=(\d{3})+(?!\d))", ",", regex=True).to_numpy()
+
+    out = np.full(len(vals), "—", dtype=object)
+    out[present] = text
+    return out
+
+@st.cache_data(ttl=60, show_spinner=False)
+def build_unusual_df(frames, top_n):
+    # Identical per-contract frames (same hash) skip the whole concat/sort/format pipeline
+    # Highest Vol / OI first, missing ratios last; sort the key only, then gather rows once.
+    # The overall top N can only come from each frame's own top N, so trim before stitching
+    keys = [f["Vol / OI"].to_numpy(dtype=float, na_value=-np.inf) for f in frames]
+    picks = [np.argsort(-k, kind="stable")[:top_n] for k in keys]
+    key = np.concatenate([k[p] for k, p in zip(keys, picks)])
+    order = np.argsort(-key, kind="stable")[:top_n]
+
+    # Stitch each displayed column's arrays directly (all frames share find_unusual's layout)
+    df = pd.DataFrame(
+        {
+            c: np.concatenate([f[c].to_numpy()[p] for f, p in zip(frames, picks)])[order]
+            for c in DISPLAY_COLS
+        },
+        copy=False,
+    )
 
-for symbol in watchlist:
-    try:
-        spot = get_spot_price(symbol)
-        if spot is None:
-            continue
+    # Ensure numeric columns are clean
+    numeric_cols = [
+        "% From Spot",
+        "Relative Volume",
+        "Vol / OI",
+        "Implied Volatility",
+        "Volume",
+        "Open Interest",
+        "Strike",
+        "Spot",
+    ]
 
-        expirations = get_expirations(symbol)
-        if not expirations:
-            continue
+    # Only re-parse columns that didn't already come out of concat as numbers
+    present = df.columns.intersection(numeric_cols)
+    todo = present.difference(df[present].select_dtypes(include="number").columns)
+    if len(todo):
+        df[todo] = df[todo].apply(pd.to_numeric, errors="coerce")
+
+    # Activity visual encoding (NO Styler): back to kernel codes, then one gather
+    codes = pd.Categorical(df["Activity"], categories=ACTIVITY_LABELS).codes
+    df["Activity"] = np.take(ACTIVITY_DISPLAY, np.where(codes < 0, 0, codes))
+
+    # Formatting for display (plain ratios are formatted client-side via column_config)
+    for col, fmt, scale, thousands in DISPLAY_FORMATS:
+        df[col] = format_column(df[col], fmt, scale, thousands)
+
+    # Arrow-backed columns let st.dataframe hand the buffers to its Arrow serializer as-is
+    return df.convert_dtypes(dtype_backend="pyarrow")
+
+# Thresholds are explicit args so the cache key changes exactly when the sidebar does
+@st.cache_data(ttl=60, max_entries=512, show_spinner=False)
+def find_unusual(df, option_type, symbol, expiration, spot, thresholds):
+    unusual_min, high_min, extreme_min, min_volume = thresholds
+
+    # Read-only on df: derive everything on raw arrays, then build the (small) output frame once
+    vol = df["volume"].to_numpy(dtype=float, na_value=0).astype(np.int64)
+    oi = df["openInterest"].to_numpy(dtype=float, na_value=np.nan)
+    strike = df["strike"].to_numpy(dtype=float)
+    iv = df["impliedVolatility"].to_numpy(dtype=float, na_value=np.nan)
+
+    # Relative volume is against the median of the whole chain (zeros included)
+    median_vol = float(np.median(vol)) if len(vol) else np.nan
+
+    vol_oi, pct_from_spot, rel_vol, activity, moneyness, mask = classify_chain(
+        vol, oi, strike, float(spot), median_vol,
+        float(unusual_min), float(high_min), float(extreme_min), int(min_volume),
+        option_type == "CALL",
+    )
 
-        expiration = expiration_map.get(symbol)
-        if not expiration:
-            continue
+    # Zero open interest is shown as missing, matching the undefined Vol / OI
+    oi = np.where(oi == 0, np.nan, oi)
+
+    return pd.DataFrame({
+        "Ticker": symbol,
+        "Type": option_type,
+        "Expiration": expiration,
+        "Strike": strike[mask],
+        "Spot": spot,
+        "% From Spot": pct_from_spot[mask],
+        "Moneyness": MONEYNESS_LABELS[moneyness[mask]],
+        "Volume": vol[mask],
+        "Relative Volume": rel_vol[mask],
+        "Open Interest": oi[mask],
+        "Vol / OI": vol_oi[mask],
+        "Activity": ACTIVITY_LABELS[activity[mask]],
+        "Implied Volatility": iv[mask],
+    })
 
-        calls, puts = load_chain(symbol, expiration)
+def _fetch_symbol(symbol, expiration, spot, thresholds):
+    # Runs on a worker thread: no st.* UI calls in here, errors surface via .result()
+    if spot is None:
+        # A missing quote is a failed fetch (like a chain error), not an empty chain
+        raise LookupError(f"{symbol}: no spot price")
 
-        call_vol = calls["volume"].fillna(0).sum()
-        put_vol = puts["volume"].fillna(0).sum()
-        ratio = call_vol / put_vol if put_vol > 0 else None
+    expirations = get_expirations(symbol)
+    if not expirations:
+        return None
+
+    if not expiration:
+        return None
+
+    calls, puts = load_chain(symbol, expiration)
+
+    call_vol = int(np.nansum(calls["volume"].to_numpy(dtype=float, na_value=np.nan)))
+    put_vol = int(np.nansum(puts["volume"].to_numpy(dtype=float, na_value=np.nan)))
+    ratio = call_vol / put_vol if put_vol > 0 else None
+
+    bias = "Neutral"
+    if ratio is not None:
+        if ratio > 1.3:
+            bias = "Call-heavy"
+        elif ratio < 0.7:
+            bias = "Put-heavy"
+
+    imbalance_row = {
+        "Ticker": symbol,
+        "Expiration": expiration,
+        "Call Volume": call_vol,
+        "Put Volume": put_vol,
+        "Call / Put Ratio": ratio,
+        "Flow Bias": bias
+    }
 
+    return (
+        imbalance_row,
+        find_unusual(calls, "CALL", symbol, expiration, spot, thresholds),
+        find_unusual(puts, "PUT", symbol, expiration, spot, thresholds),
+    )
 
-        bias = "Neutral"
-        if ratio is not None:
-            if ratio > 1.3:
-                bias = "Call-heavy"
-            elif ratio < 0.7:
-                bias = "Put-heavy"
+# =========================
+# Main processing
+# =========================
+FETCH_TIMEOUT = 10  # seconds to wait on the slowest ticker
+
+def collect_results(watchlist, expiration_map, thresholds, max_age=SNAPSHOT_TTL,
+                    fallback_age=2 * SNAPSHOT_TTL):
+    contract_results = []
+    imbalance_rows = []
+
+    # Results depend on the day, watchlist, chosen expirations and thresholds
+    snapshot_key = hashlib.sha1(repr((
+        pd.Timestamp.utcnow().strftime("%Y-%m-%d"),
+        tuple(watchlist),
+        tuple(expiration_map.get(s) for s in watchlist),
+        thresholds,
+    )).encode()).hexdigest()[:16]
+    contracts_snapshot = snapshot_path("results", snapshot_key)
+    imbalance_snapshot = snapshot_path("imbalance", snapshot_key)
+
+    cached_contracts = load_snapshot(contracts_snapshot, max_age)
+    cached_imbalance = load_snapshot(imbalance_snapshot, max_age)
+    from_snapshot = cached_contracts is not None and cached_imbalance is not None
+
+    if from_snapshot:
+        contract_results = [cached_contracts]
+        imbalance_rows = cached_imbalance.to_dict("records")
+
+    elif watchlist:
+        spots = get_spot_prices(tuple(watchlist))
+
+        results = {}
+        problems = {}
+        executor = ThreadPoolExecutor(max_workers=min(16, len(watchlist)))
+        futures = {
+            executor.submit(
+                _fetch_symbol, symbol, expiration_map.get(symbol), spots.get(symbol), thresholds
+            ): symbol
+            for symbol in watchlist
+        }
+
+        try:
+            for future in as_completed(futures, timeout=FETCH_TIMEOUT):
+                symbol = futures[future]
+                try:
+                    results[symbol] = future.result()
+                except Exception:
+                    problems[symbol] = "failed to load options data"
+        except FetchTimeout:
+            # A future can finish after as_completed's last check; collect it rather than drop it
+            for future, symbol in futures.items():
+                if not future.done():
+                    problems[symbol] = "timed out loading options data"
+                elif symbol not in results and symbol not in problems:
+                    try:
+                        results[symbol] = future.result()
+                    except Exception:
+                        problems[symbol] = "failed to load options data"
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        failed = any(symbol not in results for symbol in watchlist)
+
+        # A symbol that errored or timed out this tick shows its last good result (same
+        # expiration and thresholds) for up to fallback_age, labelled with when it was fetched
+        now = time.time()
+        last_results = st.session_state.get("last_results", {})
+        current = {}
+        for symbol in watchlist:
+            key = (symbol, expiration_map.get(symbol), thresholds)
+            if symbol in results:
+                if results[symbol] is not None:
+                    current[key] = (now, results[symbol])
+                continue
+
+            problem = problems.get(symbol, "timed out loading options data")
+            fetched_at, last = last_results.get(key, (0.0, None))
+            if last is None or now - fetched_at > fallback_age:
+                st.warning(f"{symbol}: {problem}")
+                continue
+
+            # Carried over with its original fetch time, so it ages out instead of renewing
+            results[symbol] = last
+            current[key] = (fetched_at, last)
+            fetched = pd.Timestamp(fetched_at, unit="s", tz="UTC").strftime("%H:%M UTC")
+            st.warning(f"{symbol}: {problem}; showing rows from {fetched}")
+        st.session_state["last_results"] = current
+
+        # Keep watchlist order regardless of completion order
+        for symbol in watchlist:
+            result = results.get(symbol)
+            if result is None:
+                continue
+
+            imbalance_row, call_df, put_df = result
+            imbalance_rows.append(imbalance_row)
+            contract_results.append(call_df)
+            contract_results.append(put_df)
+
+        # Persist only complete runs; a partial one would hide its warnings from other sessions
+        if imbalance_rows and not failed:
+            found = [d for d in contract_results if not d.empty] or contract_results[:1]
+            save_snapshot(pd.concat(found, ignore_index=True, copy=False), contracts_snapshot)
+            save_snapshot(pd.DataFrame(imbalance_rows), imbalance_snapshot)
+
+    return imbalance_rows, contract_results
 
-        imbalance_rows.append({
-            "Ticker": symbol,
-            "Expiration": expiration,
-            "Call Volume": int(call_vol),
-            "Put Volume": int(put_vol),
-            "Call / Put Ratio": ratio,
-            "Flow Bias": bias
-        })
+# =========================
+# Auto-refresh cadence
+# =========================
+MARKET_TZ = "America/New_York"
+MARKET_OPEN = 9 * 60 + 30  # minutes after midnight ET
+MARKET_CLOSE = 16 * 60
 
-        contract_results.append(find_unusual(calls, "CALL", symbol, expiration, spot))
-        contract_results.append(find_unusual(puts, "PUT", symbol, expiration, spot))
+def compute_next_poll_interval(now_et):
+    # Poll hardest around the open/close, steadily mid-session, rarely when the market is shut
+    minutes = now_et.hour * 60 + now_et.minute
+    if now_et.weekday() >= 5 or not MARKET_OPEN <= minutes < MARKET_CLOSE:
+        return 300
+    if minutes < MARKET_OPEN + 30 or minutes >= MARKET_CLOSE - 30:
+        return 15
+    return 60
 
-    except Exception:
-        st.warning(f"{symbol}: failed to load options data")
+poll_interval = compute_next_poll_interval(pd.Timestamp.now(tz=MARKET_TZ))
 
 # =========================
 # Tables
 # =========================
-if imbalance_rows:
-    st.markdown("#### ⚖️ Call vs Put Volume Imbalance")
-    imbalance_df = pd.DataFrame(imbalance_rows)
-    st.dataframe(imbalance_df, use_container_width=True, hide_index=True)
-
-st.markdown("---")
-
-valid = [df for df in contract_results if not df.empty]
-
-st.markdown("#### 🚨 Contract-Level Unusual Options Activity")
+# Only this panel reruns on the auto-refresh tick; sidebar and feedback form stay put
+@st.fragment(run_every=poll_interval if AUTO_REFRESH else None)
+def activity_panel():
+    # run_every is fixed per full run, so a full rerun picks up the next market phase
+    if AUTO_REFRESH and compute_next_poll_interval(pd.Timestamp.now(tz=MARKET_TZ)) != poll_interval:
+        st.rerun()
+
+    imbalance_rows, contract_results = collect_results(
+        watchlist,
+        expiration_map,
+        thresholds,
+        max_age=min(SNAPSHOT_TTL, poll_interval),
+        fallback_age=2 * poll_interval,
+    )
 
-if valid:
-    df = pd.concat(valid).sort_values("Vol / OI", ascending=False)
+    if imbalance_rows:
+        st.markdown("#### ⚖️ Call vs Put Volume Imbalance")
+        imbalance_df = pd.DataFrame(imbalance_rows)
+        st.dataframe(imbalance_df, use_container_width=True, hide_index=True)
 
-    # Ensure numeric columns are clean
-    numeric_cols = [
-        "% From Spot",
-        "Relative Volume",
-        "Vol / OI",
-        "Implied Volatility",
-        "Volume",
-        "Open Interest",
-        "Spot",
-    ]
+    st.markdown("---")
 
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
+    valid = tuple(df for df in contract_results if not df.empty)
 
-    # Activity visual encoding (NO Styler)
-    activity_display = {
-        "Extreme": "🟨 Extreme",
-        "High": "🟪 High",
-        "Unusual": "🟦 Unusual",
-    }
+    st.markdown("#### 🚨 Contract-Level Unusual Options Activity")
 
-    df["Activity"] = df["Activity"].map(activity_display).fillna("Normal")
+    if valid:
+        total = sum(len(df) for df in valid)
+        if total > TOP_N:
+            st.caption(f"Showing the top {TOP_N:,} of {total:,} contracts by Vol / OI.")
 
-    # Formatting for display
-    df["% From Spot"] = df["% From Spot"].map(lambda x: f"{x:.1f}%" if pd.notna(x) else "—")
-    df["Relative Volume"] = df["Relative Volume"].map(lambda x: f"{x:.1f}" if pd.notna(x) else "—")
-    df["Vol / OI"] = df["Vol / OI"].map(lambda x: f"{x:.2f}" if pd.notna(x) else "—")
-    df["Implied Volatility"] = df["Implied Volatility"].map(lambda x: f"{x:.2%}" if pd.notna(x) else "—")
-    df["Spot"] = df["Spot"].map(lambda x: f"${x:,.2f}" if pd.notna(x) else "—")
+        st.dataframe(
+            build_unusual_df(valid, TOP_N),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "% From Spot": st.column_config.NumberColumn(format="%.1f%%"),
+                "Relative Volume": st.column_config.NumberColumn(format="%.1f"),
+                "Vol / OI": st.column_config.NumberColumn(format="%.2f"),
+            },
+        )
 
-    st.dataframe(df, use_container_width=True, hide_index=True)
+    else:
+        st.info("No unusual activity detected.")
 
-else:
-    st.info("No unusual activity detected.")
+activity_panel()
 
 
 # =========================
 # Feedback (EMAIL)
 # =========================
-import smtplib
-from email.message import EmailMessage
+# One authenticated connection per process, reused across submissions
+@st.cache_resource(show_spinner=False)
+def get_smtp():
+    server = smtplib.SMTP(st.secrets["EMAIL_HOST"], st.secrets["EMAIL_PORT"])
+    server.starttls()
+    server.login(st.secrets["EMAIL_USER"], st.secrets["EMAIL_PASSWORD"])
+    return server
+
+@st.cache_resource
+def smtp_lock():
+    return threading.Lock()
+
+def send_feedback(headers, body):
+    # Sessions share the connection, so serialise sends and reconnect if it went stale
+    with smtp_lock():
+        server = get_smtp()
+        try:
+            alive = server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            alive = False
+
+        if not alive:
+            # Release the dead socket/TLS session before dropping it from the cache
+            try:
+                server.close()
+            except (smtplib.SMTPException, OSError):
+                pass
+            get_smtp.clear()
+            server = get_smtp()
+
+        # Raw 8bit skips quoted-printable re-encoding, but only if the server advertises 8BITMIME
+        # and every line fits SMTP's 998-octet limit; otherwise email keeps the body 7-bit clean
+        raw_8bit = server.has_extn("8bitmime") and (
+            max(len(line.encode()) for line in body.splitlines()) <= 998
+        )
+        msg = EmailMessage(policy=email_policy if raw_8bit else email_policy.clone(cte_type="7bit"))
+        for name, value in headers.items():
+            msg[name] = value
+        msg.set_content(body, subtype="plain", charset="utf-8", cte="8bit" if raw_8bit else None)
+
+        server.send_message(msg, mail_options=["BODY=8BITMIME"] if raw_8bit else [])
+
+@st.cache_resource
+def smtp_executor():
+    return ThreadPoolExecutor(max_workers=2)
+
+FEEDBACK_SUBJECT = "🐞 Options Dashboard Feedback — {feedback_type}"
+FEEDBACK_BODY = """
+Feedback type:
+{feedback_type}
+
+Message:
+{message}
+
+Contact:
+{contact}"""
 
 st.markdown("---")
 st.markdown("### 💬 Feedback & Bug Reports 🐞")
@@ -368,6 +737,14 @@ with st.expander("Let the dev know how to make this better!", expanded=False):
         "[Open an issue here](https://github.com/saberbrasher/options-dashboard/issues)"
     )
 
+    # ---- Sends finished since the last render (only failures are reported) ----
+    pending = st.session_state.setdefault("feedback_sends", [])
+    for future in [f for f in pending if f.done()]:
+        pending.remove(future)
+        if future.exception() is not None:
+            st.error("Failed to send feedback email.")
+            st.exception(future.exception())
+
     # ---- Live UI (outside form) ----
     allow_followup = st.checkbox("I'm okay being contacted")
 
@@ -398,46 +775,23 @@ with st.expander("Let the dev know how to make this better!", expanded=False):
             st.warning("Please enter feedback before submitting.")
         else:
             try:
-                msg = EmailMessage()
-                msg["Subject"] = f"🐞 Options Dashboard Feedback — {feedback_type}"
-                msg["From"] = st.secrets["EMAIL_USER"]
-                msg["To"] = st.secrets["EMAIL_TO"]
-
-                body = f"""
-Feedback type:
-{feedback_type}
+                headers = {
+                    "Subject": FEEDBACK_SUBJECT.format(feedback_type=feedback_type),
+                    "From": st.secrets["EMAIL_USER"],
+                    "To": st.secrets["EMAIL_TO"],
+                }
 
-Message:
-{feedback_text}
-"""
-
-                if allow_followup and contact_info:
-                    body += f"\nContact:\n{contact_info}"
-                else:
-                    body += "\nContact:\nAnonymous"
-
-                msg.set_content(body)
+                body = FEEDBACK_BODY.format(
+                    feedback_type=feedback_type,
+                    message=feedback_text,
+                    contact=contact_info if (allow_followup and contact_info) else "Anonymous",
+                )
 
-                with smtplib.SMTP(
-                    st.secrets["EMAIL_HOST"],
-                    st.secrets["EMAIL_PORT"]
-                ) as server:
-                    server.starttls()
-                    server.login(
-                        st.secrets["EMAIL_USER"],
-                        st.secrets["EMAIL_PASSWORD"]
-                    )
-                    server.send_message(msg)
+                # SMTP round-trip (and the encoding choice it depends on) happens off the script thread
+                pending.append(smtp_executor().submit(send_feedback, headers, body))
 
-                st.success("Thanks! Your feedback was sent 💌")
+                st.success("Thanks! Your feedback is on its way 💌")
 
             except Exception as e:
                 st.error("Failed to send feedback email.")
                 st.exception(e)
-
-# =========================
-# Auto-refresh
-# =========================
-if AUTO_REFRESH:
-    time.sleep(60)
-    st.rerun()